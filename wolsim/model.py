@@ -1,10 +1,109 @@
 """Forwards simulation of the agent based model with wolbachia.
 """
 
-import copy
-import random
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from pde import FieldCollection, PDEBase, ScalarField, UnitGrid
+from scipy import ndimage
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import cupy
+    from cupyx.scipy import ndimage as cupy_ndimage
+except ImportError:
+    cupy = None
+
+
+# Displacements for the four diffusion directions (left, right, up, down)
+_DIRECTIONS = np.array([[-1, 0], [1, 0], [0, 1], [0, -1]])
+
+# Discrete Laplacian stencil for the continuum diffusion mode
+_LAPLACE_KERNEL = np.array([[0, 1, 0],
+                            [1, -4, 1],
+                            [0, 1, 0]], dtype=np.float32)
+
+# Tile edge for the blocked grid traversal: a 32x32 float64 tile plus its
+# one-cell halo is ~8KB, so a few tiles fit comfortably in L1 cache
+_TILE = 32
+
+
+class _ConcentrationPDE(PDEBase):
+    """PDE for the concentration of the wolbachia-produced compound.
+
+    Reads the wolbachia and virus grids from the owning model, so a
+    single instance can be reused across every time step.
+    """
+    def __init__(self, outer, D=1.0, gamma=1.0, w=1.0, g=1.0, bc="auto_periodic_neumann"):
+        super().__init__()
+        self.D = D
+        self.gamma = gamma
+        self.w = w
+        self.g = g
+        self.bc = bc
+        self.outer = outer
+        # Resolve the boundary conditions and compile the laplacian once
+        # instead of on every right-hand-side evaluation
+        self._laplace = outer._pde_grid.make_operator('laplace', bc=bc)
+
+    def get_state(self, s):
+        s.label = 'concentration'
+        return FieldCollection([s,])
+
+    def evolution_rate(self, state, t=0):
+        s, = state
+        ds_dt = self.D * self._laplace(s.data) - self.gamma * s.data \
+            + self.w * self.outer.wolbachia_grid \
+            - self.g * s.data * self.outer._to_cpu(self.outer.virus_grid[0])
+        return FieldCollection([ScalarField(s.grid, ds_dt),])
+
+
+if numba is not None:
+    @numba.njit(cache=True, nogil=True)
+    def _diffuse_kernel(virus, diffuse_rate, n_x, n_y, rng):  # pragma: no cover
+        """Diffuse one virus grid with per-copy random walks.
+
+        Compiled per-cell loop preserving the agent-level semantics:
+        each copy takes Poisson(diffuse_rate) uniformly directed steps
+        and is removed if it steps off the grid. Writes scatter to
+        neighboring cells, so the loop runs sequentially rather than
+        with prange.
+
+        The grid is traversed in _TILE x _TILE blocks so that a tile and
+        the neighboring cells its walks touch stay resident in cache.
+        """
+        for i0 in range(0, n_x, _TILE):
+            for j0 in range(0, n_y, _TILE):
+                for i in range(i0, min(i0 + _TILE, n_x)):
+                    for j in range(j0, min(j0 + _TILE, n_y)):
+                        v = int(virus[i, j])
+                        for _ in range(v):
+                            num_steps = rng.poisson(diffuse_rate)
+                            if num_steps == 0:
+                                continue
+                            x, y = i, j
+                            virus[i, j] -= 1
+                            alive = True
+                            for _ in range(num_steps):
+                                direction = rng.integers(0, 4)
+                                if direction == 0:
+                                    x -= 1
+                                elif direction == 1:
+                                    x += 1
+                                elif direction == 2:
+                                    y += 1
+                                else:
+                                    y -= 1
+                                if x < 0 or x >= n_x or y < 0 or y >= n_y:
+                                    # It left the grid
+                                    alive = False
+                                    break
+                            if alive:
+                                virus[x, y] += 1
 
 
 class AgentBasedModel:
@@ -12,7 +111,7 @@ class AgentBasedModel:
     
     This class supports two variants of the model.
     """
-    def __init__(self, n_x, n_y, model='signalling'):
+    def __init__(self, n_x, n_y, model='signalling', diffusion_mode='agent', use_gpu=False):
         """
         Parameters
         ----------
@@ -22,33 +121,99 @@ class AgentBasedModel:
             Number of grid cells in y direction
         model : {'signalling', 'genetic'}
             Which variant of the model to run
+        diffusion_mode : {'agent', 'continuum'}
+            How to diffuse the virus: per-copy random walks, or the
+            statistically equivalent Laplacian drift with Poisson noise
+            applied to the whole grid at once
+        use_gpu : bool, optional (False)
+            Keep the virus grids on the GPU and run the growth and
+            diffusion passes there (requires cupy). Mostly worthwhile
+            for large grids, where the whole-array passes outweigh the
+            host-device transfers.
         """
         self.n_x = n_x
         self.n_y = n_y
 
+        if diffusion_mode not in ('agent', 'continuum'):
+            raise ValueError('Diffusion mode not recognized.')
+        self.diffusion_mode = diffusion_mode
+
+        if use_gpu and cupy is None:
+            raise ImportError('use_gpu=True requires the cupy package.')
+        self.use_gpu = use_gpu
+        self.xp = cupy if use_gpu else np
+
         if model == 'signalling':
             self.num_virus = 1
             self.model = model
+            self._grow_virus = self._grow_signalling
         elif model == 'genetic':
             self.num_virus = 2
             self.model = model
+            self._grow_virus = self._grow_genetic
         else:
             raise ValueError('Model variant not recognized.')
 
-        self.virus_grid = {}
-        for i in range(self.num_virus):
-            self.virus_grid[i] = np.zeros((n_x, n_y))
+        # float32 halves the cache footprint of the simulation grids and
+        # easily holds the virus counts and concentrations involved;
+        # wolbachia presence is a flag
+        self.virus_grid = self.xp.zeros((self.num_virus, n_x, n_y), dtype=np.float32)
+
+        # The concentration PDE always solves on the host, so these
+        # grids stay in ordinary NumPy arrays
+        self.conc_grid = np.zeros((n_x, n_y), dtype=np.float32)
+        self.wolbachia_grid = np.zeros((n_x, n_y), dtype=np.uint8)
 
-        self.conc_grid = np.zeros((n_x, n_y))
-        self.wolbachia_grid = np.zeros((n_x, n_y))
+        # Growth inhibition factor exp(-20 * concentration), refreshed
+        # whenever the concentration grid is updated
+        self._inhibit = self.xp.ones((n_x, n_y), dtype=np.float32)
 
-        self.virus_diffuse_rate = {}
-        self.virus_carrying_capacity = {}
-        self.virus_growth_rate = {}
+        self.virus_diffuse_rate = np.zeros(self.num_virus)
+        self.virus_carrying_capacity = np.zeros(self.num_virus)
+        self.virus_growth_rate = np.zeros(self.num_virus)
+
+        # Virus history lives in one preallocated array whose capacity
+        # doubles when full; virus_grid_history exposes the filled part
+        self._virus_history = np.empty((64, self.num_virus, n_x, n_y),
+                                       dtype=self.virus_grid.dtype)
+        self._num_recorded = 0
 
-        self.virus_grid_history = []
         self.concentration_history = []
 
+        self._rng = np.random.default_rng()
+        # Independent generator per variant, so diffusion passes can run
+        # on separate threads without sharing generator state
+        self._diffuse_rngs = self._rng.spawn(self.num_virus)
+
+        self._pde_grid = UnitGrid([n_x, n_y])
+        self._pde_state = ScalarField(self._pde_grid, 0)
+        self._pde = _ConcentrationPDE(self)
+
+    @property
+    def virus_grid_history(self):
+        """Recorded virus grids, as an array of shape (t, num_virus, n_x, n_y)."""
+        return self._virus_history[:self._num_recorded]
+
+    def _to_cpu(self, a):
+        """Return an array as a host-side NumPy array."""
+        if self.use_gpu:
+            return cupy.asnumpy(a)
+        return a
+
+    def _poisson(self, lam):
+        """Poisson draw on the active array backend."""
+        if self.use_gpu:
+            return cupy.random.poisson(lam)
+        return self._rng.poisson(lam)
+
+    def _record_virus_grid(self):
+        """Snapshot the current virus grid into the history buffer."""
+        if self._num_recorded == len(self._virus_history):
+            self._virus_history = np.concatenate(
+                (self._virus_history, np.empty_like(self._virus_history)))
+        self._virus_history[self._num_recorded] = self._to_cpu(self.virus_grid)
+        self._num_recorded += 1
+
     def set_virus_parameters(self, diffuse_rate, growth_rate, carrying_capacity, virus_num=0):
         """Set the parameters controlling virus diffusion and growth.
         
@@ -77,20 +242,20 @@ class AgentBasedModel:
         p : float
             probability of there being wolbachia in a cell
         """
-        self.wolbachia_grid[:15, :15] = np.random.choice((0, 1), size=((15, 15)), p=[1-p, p])
+        self.wolbachia_grid[:15, :15] = (self._rng.random((15, 15)) < p).astype(self.wolbachia_grid.dtype)
         
         self.update_concentration()
-        self.concentration_history.append(copy.deepcopy(self.conc_grid))
+        self.concentration_history.append(self.conc_grid.copy())
 
     def initialize_wolbachia_barrier(self):
         self.wolbachia_grid[7:13, :] = np.ones(self.wolbachia_grid[7:13, :].shape)
 
         self.update_concentration()
-        self.concentration_history.append(copy.deepcopy(self.conc_grid))
+        self.concentration_history.append(self.conc_grid.copy())
 
     def initialize_virus_barrier(self):
-        self.virus_grid[0][2, 10] = 1
-        self.virus_grid_history.append(copy.deepcopy(self.virus_grid))
+        self.virus_grid[0, 2, 10] = 1
+        self._record_virus_grid()
 
     def initialize_virus(self, virus_num=0):
         """Initialize the virus grid.
@@ -100,47 +265,29 @@ class AgentBasedModel:
         virus_num : int, optional (0)
             Which type of the virus in the genetic model (0=unmodified, 1=modified)
         """
-        self.virus_grid[virus_num][15, 15] = 1
-        self.virus_grid_history.append(copy.deepcopy(self.virus_grid))
+        self.virus_grid[virus_num, 15, 15] = 1
+        self._record_virus_grid()
 
     def update_concentration(self):
         """Solve a PDE to update concentration based on wolbachia locations.
         """
-        class PDE(PDEBase):
-            def __init__(self, outer, D=1.0, gamma=1.0, w=1.0, g=1.0, bc="auto_periodic_neumann"):
-                super().__init__()
-                self.D = D
-                self.gamma = gamma
-                self.w = w
-                self.g = g
-                self.bc = bc
-                self.outer = outer
-
-            def get_state(self, s):
-                s.label = 'concentration'
-                return FieldCollection([s,])
-
-            def evolution_rate(self, state, t=0):
-                s, = state
-                eta = ScalarField(s.grid, data=self.outer.wolbachia_grid)
-                v = ScalarField(s.grid, data=self.outer.virus_grid[0])
-                ds_dt = self.D * s.laplace(self.bc) - self.gamma * s + self.w * eta - self.g * s * v
-                return FieldCollection([ds_dt,])
-       
-        def create_pde(outer):
-            return PDE(outer)
-
-        eq = create_pde(self)
-        grid = UnitGrid([self.n_x, self.n_y])
-        s = ScalarField(grid, 0)
-        state = eq.get_state(s)
-        sol = eq.solve(state, t_range=10, dt=1e-1, tracker=None)
-        self.conc_grid = sol.data[0, :, :]
-    
+        self._pde_state.data[...] = 0
+        state = self._pde.get_state(self._pde_state)
+        sol = self._pde.solve(state, t_range=10, dt=1e-1, tracker=None)
+        np.copyto(self.conc_grid, sol.data[0])
+        if self.use_gpu:
+            self._inhibit = cupy.exp(-20 * cupy.asarray(self.conc_grid))
+        else:
+            np.exp(-20 * self.conc_grid, out=self._inhibit)
 
     def _diffuse_virus(self, k, i, j):
         """Move virus to neighboring cells.
 
+        Each virus copy in the cell performs a random walk of
+        Poisson(diffuse_rate) uniformly directed steps. Copies that step
+        off the grid are removed. All walks are simulated at once with
+        vectorized draws rather than per-copy Python loops.
+
         Parameters
         ----------
         k : int
@@ -150,94 +297,218 @@ class AgentBasedModel:
         j : int
             y starting location
         """
-        v = self.virus_grid[k][i, j]
-
-        for _ in range(int(v)):
-            num_diffuses = np.random.poisson(self.virus_diffuse_rate[k])
-
-            coords = (i, j)
-
-            for _ in range(num_diffuses):
-                dir = random.choice(['left', 'right', 'up', 'down'])
-
-                self.virus_grid[k][*coords] -= 1
-
-                if dir == 'left':
-                    new_coords = (i-1, j)
-                
-                elif dir == 'right':
-                    new_coords = (i+1, j)
-                
-                elif dir == 'up':
-                    new_coords = (i, j+1)
-                
-                elif dir == 'down':
-                    new_coords = (i, j-1)
-
-                x_new, y_new = new_coords
-                if 0 <= x_new < self.n_x and 0 <= y_new < self.n_y:
-                    self.virus_grid[k][*new_coords] += 1
-                    coords = new_coords
-                else:
-                    # It left the grid, stop moving it
-                    break
-
-    def _grow_virus(self, k, i, j):
-        """Grow the virus within its current cell.
-        
+        v = int(self.virus_grid[k, i, j])
+        if v == 0:
+            return
+
+        num_steps = self._diffuse_rngs[k].poisson(self.virus_diffuse_rate[k], size=v)
+        num_steps = num_steps[num_steps > 0]
+        if num_steps.size == 0:
+            return
+
+        total_steps = int(num_steps.sum())
+        steps = _DIRECTIONS[self._diffuse_rngs[k].integers(0, 4, size=total_steps)]
+
+        # Cumulative positions along every walk: one global cumulative sum,
+        # then subtract each walk's starting offset
+        ends = np.cumsum(num_steps)
+        starts = ends - num_steps
+        path = np.cumsum(steps, axis=0)
+        offsets = np.zeros((num_steps.size, 2), dtype=path.dtype)
+        offsets[1:] = path[ends[:-1] - 1]
+        walk = np.repeat(np.arange(num_steps.size), num_steps)
+        positions = path - offsets[walk] + (i, j)
+
+        in_bounds = ((positions[:, 0] >= 0) & (positions[:, 0] < self.n_x)
+                     & (positions[:, 1] >= 0) & (positions[:, 1] < self.n_y))
+
+        # A copy survives only if it never stepped off the grid
+        survived = np.logical_and.reduceat(in_bounds, starts)
+        final = positions[ends - 1][survived]
+
+        self.virus_grid[k, i, j] -= num_steps.size
+        if final.size:
+            np.add.at(self.virus_grid[k], (final[:, 0], final[:, 1]), 1)
+
+    def _grow_signalling(self, k):
+        """Grow the virus in every cell of the grid (signalling model).
+
+        Logistic growth damped by the inhibition factor, evaluated for
+        the whole grid at once: one Poisson draw for the cells with
+        positive growth (births) and one for the cells with negative
+        growth (deaths).
+
         Parameters
         ----------
         k : int
-            Which virus variant (in genetic model)
-        i : int
-            x location
-        j : int
-            y location
+            Which virus variant (always 0 in the signalling model)
         """
-        v = self.virus_grid[k][i, j]
+        xp = self.xp
+        v = self.virus_grid[k]
+        if not v.any():
+            return
 
-        total_virus = sum([self.virus_grid[k][i, j] for k in range(self.num_virus)])
+        growth = self.virus_growth_rate[k] * self._inhibit \
+                * v * (1 - v / self.virus_carrying_capacity[k])
 
-        if self.model == 'signalling':
-            growth = self.virus_growth_rate[k]*(np.exp(-20*self.conc_grid[i, j])) \
-                    * v * (1 - total_virus / self.virus_carrying_capacity[k])
-        
-        else:
-            growth = self.virus_growth_rate[k] \
-                    * v * (1 - total_virus / self.virus_carrying_capacity[k])
-                
+        births = self._poisson(xp.maximum(growth, 0))
+        deaths = self._poisson(xp.maximum(-growth, 0))
 
-        if growth > 0:
-            if self.num_virus == 1:
-                self.virus_grid[k][i, j] = v + np.random.poisson(growth)
-            else:
-                if self.wolbachia_grid[i, j] == 1:
-                    self.virus_grid[1][i, j] = self.virus_grid[1][i, j] + np.random.poisson(growth)
-                else:
-                    self.virus_grid[k][i, j] = self.virus_grid[k][i, j] + np.random.poisson(growth)
-        
-        if growth < 0:
-            self.virus_grid[k][i, j] = max(0, v - np.random.poisson(-growth))
+        self.virus_grid[k] = xp.maximum(v + births - deaths, 0)
+
+    def _grow_genetic(self, k):
+        """Grow the virus in every cell of the grid (genetic model).
+
+        Same whole-grid logistic growth, except that both variants share
+        the carrying capacity and growth in a cell with wolbachia
+        produces the modified virus instead.
+
+        Parameters
+        ----------
+        k : int
+            Which virus variant (0=unmodified, 1=modified)
+        """
+        xp = self.xp
+        v = self.virus_grid[k]
+        if not v.any():
+            return
+
+        total_virus = self.virus_grid.sum(axis=0)
+
+        growth = self.virus_growth_rate[k] \
+                * v * (1 - total_virus / self.virus_carrying_capacity[k])
+
+        births = self._poisson(xp.maximum(growth, 0))
+        deaths = self._poisson(xp.maximum(-growth, 0))
+
+        wolbachia = xp.asarray(self.wolbachia_grid) == 1
+        self.virus_grid[1][wolbachia] += births[wolbachia]
+        self.virus_grid[k][~wolbachia] += births[~wolbachia]
+
+        self.virus_grid[k] = xp.maximum(self.virus_grid[k] - deaths, 0)
 
     def update_virus(self, k):
         """One iteration of virus agent based simulation.
+
+        Growth is applied to the whole grid in one vectorized pass, after
+        which every occupied cell diffuses its virus copies.
+        """
+        self._grow_virus(k)
+        self._diffuse_virus_pass(k)
+
+    def _diffuse_virus_pass(self, k):
+        """Diffuse one virus variant across the whole grid.
+
+        In continuum mode this is one convolution-based update. For the
+        agent mode, the GPU backend uses the whole-array roll-based
+        pass; otherwise the compiled Numba kernel runs when numba is
+        installed, and the vectorized per-cell diffusion failing that.
+
+        Parameters
+        ----------
+        k : int
+            Which virus variant (in genetic model)
+        """
+        if not self.virus_grid[k].any():
+            return
+
+        if self.diffusion_mode == 'continuum':
+            self._diffuse_virus_continuum(k)
+        elif self.use_gpu:
+            self._diffuse_virus_roll(k)
+        elif numba is not None:
+            _diffuse_kernel(self.virus_grid[k], self.virus_diffuse_rate[k],
+                            self.n_x, self.n_y, self._diffuse_rngs[k])
+        else:
+            for i, j in np.argwhere(self.virus_grid[k] > 0):
+                self._diffuse_virus(k, int(i), int(j))
+
+    def _diffuse_virus_continuum(self, k):
+        """Diffuse one virus variant as a continuum (convolution) update.
+
+        The per-copy random walks average out to a Laplacian drift of
+        diffuse_rate / 4 per step, so apply that drift with a single
+        convolution and keep the stochasticity with Poisson-distributed
+        gains and losses, clipped at zero. The constant-mode boundary
+        absorbs copies that diffuse over the edge of the grid.
+
+        Parameters
+        ----------
+        k : int
+            Which virus variant (in genetic model)
         """
-        for i in range(self.n_x):
-            for j in range(self.n_y):        
-                v = self.virus_grid[k][i, j]
-                if v > 0:
-                    self._grow_virus(k, i, j)
-                    self._diffuse_virus(k, i, j)
+        xp = self.xp
+        nd = cupy_ndimage if self.use_gpu else ndimage
+
+        v = self.virus_grid[k]
+        lap = nd.convolve(v, xp.asarray(_LAPLACE_KERNEL), mode='constant')
+        drift = 0.25 * self.virus_diffuse_rate[k] * lap
+
+        gains = self._poisson(xp.maximum(drift, 0))
+        losses = self._poisson(xp.maximum(-drift, 0))
+
+        self.virus_grid[k] = xp.maximum(v + gains - losses, 0)
+
+    def _diffuse_virus_roll(self, k):
+        """Diffuse one virus variant with whole-array shifts (GPU backend).
+
+        Single-hop approximation of the per-copy random walks: each
+        copy moves to a uniformly chosen neighboring cell with
+        probability 1 - exp(-diffuse_rate), the chance of its Poisson
+        step count being nonzero, so multi-step walks are collapsed
+        into one hop. Copies shifted off the edge of the grid are
+        removed.
+
+        Parameters
+        ----------
+        k : int
+            Which virus variant (in genetic model)
+        """
+        xp = self.xp
+        v = self.virus_grid[k].astype(xp.int64)
+        p_move = float(-np.expm1(-self.virus_diffuse_rate[k]))
+
+        remaining = cupy.random.binomial(v, p_move)
+        out = (v - remaining).astype(self.virus_grid.dtype)
+
+        # Split the movers over the four directions (left, right, up,
+        # down) one binomial at a time, shift each share to its
+        # destination, and drop the share that wrapped around the edge
+        for n, (axis, step) in enumerate(((0, -1), (0, 1), (1, 1), (1, -1))):
+            if n < 3:
+                movers = cupy.random.binomial(remaining, 1 / (4 - n))
+                remaining = remaining - movers
+            else:
+                movers = remaining
+            shifted = xp.roll(movers, step, axis=axis)
+            wrapped = [slice(None), slice(None)]
+            wrapped[axis] = -1 if step == -1 else 0
+            shifted[tuple(wrapped)] = 0
+            out += shifted
+
+        self.virus_grid[k] = out
 
     def run_time_step(self):
         """One iteration of simulation.
+
+        Growth runs sequentially per variant, since the genetic model
+        redirects growth across variants. The diffusion passes only
+        touch their own variant's grid, so with multiple variants they
+        run in parallel on a thread pool (the compiled kernel releases
+        the GIL and each variant has its own random generator).
         """
         for k in range(self.num_virus):
-            self.update_virus(k)
+            self._grow_virus(k)
+
+        if self.num_virus == 1:
+            self._diffuse_virus_pass(0)
+        else:
+            with ThreadPoolExecutor(max_workers=self.num_virus) as ex:
+                list(ex.map(self._diffuse_virus_pass, range(self.num_virus)))
 
         if self.num_virus == 1:
             self.update_concentration()
-            self.concentration_history.append(copy.deepcopy(self.conc_grid))
+            self.concentration_history.append(self.conc_grid.copy())
 
-        self.virus_grid_history.append(copy.deepcopy(self.virus_grid))
+        self._record_virus_grid()
         
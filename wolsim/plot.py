@@ -42,9 +42,14 @@ class SimulationAnimation:
 
         ##### Panel 2: Compound concentration (animated) #####
         axc = fig.add_subplot(1, 3, 2)
-        first_conc = self.model.concentration_history[0]
 
-        highest_conc = np.max([np.max(a) for a in [self.model.concentration_history[i] for i in range(len(self.model.concentration_history))]])
+        # Stack the histories once so the animation callback only
+        # slices frames out of contiguous arrays
+        conc_stack = np.stack(self.model.concentration_history)
+        virus_stack = np.asarray(self.model.virus_grid_history)
+
+        first_conc = conc_stack[0]
+        highest_conc = conc_stack.max()
         imgc = axc.imshow(first_conc, cmap='Blues', norm=matplotlib.colors.LogNorm(vmin=None, vmax=highest_conc))
         legend = axc.figure.colorbar(imgc, ax=axc, shrink=0.5)
         axc.set_xticks(np.arange(self.model.n_x)[::5])
@@ -62,8 +67,8 @@ class SimulationAnimation:
         ##### Panel 3: Virus (animated) #####
         ax = fig.add_subplot(1, 3, 3)
 
-        first_config = self.model.virus_grid_history[0][0]
-        highest_virus = np.max([np.max(a) for a in [self.model.virus_grid_history[i][0] for i in range(len(self.model.virus_grid_history))]])
+        first_config = virus_stack[0, 0]
+        highest_virus = virus_stack[:, 0].max()
         img = ax.imshow(first_config, cmap='Reds',  norm=matplotlib.colors.LogNorm(vmin=1e-1, vmax=highest_virus,))
 
         def init():
@@ -72,13 +77,10 @@ class SimulationAnimation:
             return img, imgc
 
         def animate(i):
-            a = self.model.virus_grid_history[i][0]
-            img.set_array(a)
-
-            c = self.model.concentration_history[i]
-            imgc.set_data(c)
+            img.set_array(virus_stack[i, 0])
+            imgc.set_data(conc_stack[i])
 
-            return img, imgc 
+            return img, imgc
 
         ax.set_xticks(np.arange(self.model.n_x)[::5])
         ax.set_yticks(np.arange(self.model.n_y)[::5])
@@ -131,8 +133,10 @@ class SimulationAnimation:
         ##### Panel 2: unmodified virus (animated) #####
         axc = fig.add_subplot(1, 3, 2)
 
-        first_config_v0 = self.model.virus_grid_history[0][0]
-        highest_virus = np.max([np.max(a) for a in [self.model.virus_grid_history[i][0] for i in range(len(self.model.virus_grid_history))]])
+        virus_stack = np.asarray(self.model.virus_grid_history)
+
+        first_config_v0 = virus_stack[0, 0]
+        highest_virus = virus_stack[:, 0].max()
         imgc = axc.imshow(first_config_v0, cmap='Reds', norm=matplotlib.colors.LogNorm(vmin=1e-1, vmax=highest_virus+1))
         legend = axc.figure.colorbar(imgc, ax=axc, shrink=0.5)
 
@@ -150,8 +154,8 @@ class SimulationAnimation:
 
         ##### Panel 3: modified virus (animated) #####
         ax = fig.add_subplot(1, 3, 3)
-        first_config = self.model.virus_grid_history[0][0]
-        highest_virus = np.max([np.max(a) for a in [self.model.virus_grid_history[i][1] for i in range(len(self.model.virus_grid_history))]])
+        first_config = virus_stack[0, 0]
+        highest_virus = virus_stack[:, 1].max()
         img = ax.imshow(first_config, cmap='Reds',  norm=matplotlib.colors.LogNorm(vmin=1e-1, vmax=highest_virus+1))
 
         def init():
@@ -161,13 +165,10 @@ class SimulationAnimation:
             return img, imgc
 
         def animate(i):
-            a = self.model.virus_grid_history[i][1]
-            img.set_array(a)
-
-            c = self.model.virus_grid_history[i][0]
-            imgc.set_data(c)
+            img.set_array(virus_stack[i, 1])
+            imgc.set_data(virus_stack[i, 0])
 
-            return img, imgc 
+            return img, imgc
 
         ax.set_xticks(np.arange(self.model.n_x)[::5])
         ax.set_yticks(np.arange(self.model.n_y)[::5])
@@ -64,6 +64,18 @@ class TestModel(unittest.TestCase):
         self.assertTrue(np.min(model.virus_grid[0] >= 0))
         self.assertTrue(set(np.unique(model.wolbachia_grid)).issubset(set(range(1000))))
 
+    def test_update_virus_continuum(self):
+        model = wolsim.AgentBasedModel(20, 20, 'signalling', diffusion_mode='continuum')
+        model.set_virus_parameters(1.5, 1.6, 1.7)
+        model.initialize_wolbachia()
+        model.initialize_virus()
+        model.update_virus(0)
+
+        self.assertTrue(np.min(model.virus_grid[0]) >= 0)
+
+        with self.assertRaises(ValueError):
+            wolsim.AgentBasedModel(10, 10, 'signalling', diffusion_mode='a')
+
     def test_run_time_step(self):
         model = wolsim.AgentBasedModel(20, 20, 'genetic')
         model.set_virus_parameters(1.5, 1.6, 1.7)